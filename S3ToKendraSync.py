@@ -4,6 +4,7 @@ import logging
 import markdown
 from bs4 import BeautifulSoup
 import os
+from faqIndex import extract_faq_entries, sync_faq_entries
 
 # Configure logger
 
@@ -18,6 +19,9 @@ kendra = boto3.client('kendra', region_name='ap-southeast-1')
 dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-1')
 conversation_table = dynamodb.Table('ChatbotMemory')
 
+# Precomputed FAQ lookup consulted by getChabotResponse before Kendra
+faq_table = dynamodb.Table(os.environ.get('FAQ_TABLE_NAME', 'ChatbotFAQ'))
+
 # Kendra index ID
 kendra_index_id = '1c088278-9865-482f-a9bd-02403d6e9fd0'
 
@@ -55,6 +59,12 @@ def lambda_handler(event, context):
             logger.error(f"Failed to upload documents to Kendra: {response['FailedDocuments']}")
             raise Exception(f"Failed to upload documents to Kendra: {response['FailedDocuments']}")
 
+        # Update the FAQ index for this file; Kendra still has the document if this fails
+        try:
+            sync_faq_entries(faq_table, file_name, extract_faq_entries(md_content))
+        except Exception as e:
+            logger.error(f"Error updating FAQ index: {str(e)}")
+
         return {
             'statusCode': 200,
             'body': json.dumps('File successfully synced to Kendra')
@@ -0,0 +1,421 @@
+import functools
+import json
+import logging
+import random
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+logger = logging.getLogger()
+
+# Error codes that mean "back off and try again"
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'ServiceQuotaExceededException',
+}
+
+# Error codes that are transient but not throttling
+TRANSIENT_ERROR_CODES = {
+    'ServiceUnavailableException',
+    'InternalServerException',
+    'InternalFailure',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+}
+
+CONNECTION_ERRORS = (EndpointConnectionError, ConnectTimeoutError, ReadTimeoutError)
+
+# Client timeouts in seconds. A single attempt can take up to connect + read timeout,
+# so retries and failovers only start when that much of the request deadline is left.
+CONNECT_TIMEOUT = 2
+KENDRA_READ_TIMEOUT = 5
+# Bedrock's read timeout is scaled to the time left before the deadline, up to the
+# maximum; an attempt only starts if at least the minimum fits.
+BEDROCK_MAX_READ_TIMEOUT = 23
+BEDROCK_MIN_READ_TIMEOUT = 8
+
+# Shortest request deadline that still leaves room for a Kendra attempt followed by
+# a Bedrock attempt; below this, Kendra misses return 503 without calling Bedrock.
+MIN_REQUEST_SECONDS = CONNECT_TIMEOUT + KENDRA_READ_TIMEOUT + CONNECT_TIMEOUT + BEDROCK_MIN_READ_TIMEOUT
+
+# Circuit breaker states
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class ServiceUnavailableError(Exception):
+    """Base class for failing fast without (further) calls to AWS"""
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised without calling AWS when every breaker for a dependency is open"""
+
+    def __init__(self, dependency):
+        super().__init__(f"{dependency} is temporarily unavailable (circuit open)")
+        self.dependency = dependency
+
+
+class DeadlineExceededError(ServiceUnavailableError):
+    """Raised when too little of the request deadline is left for another attempt"""
+
+    def __init__(self, dependency):
+        super().__init__(f"Not enough time left to call {dependency}")
+        self.dependency = dependency
+
+
+def deadline_from_context(context, budget_seconds, margin_seconds=1.0, clock=time.monotonic):
+    """
+    Absolute deadline (on `clock`) for the AWS calls of one invocation: the request
+    budget, cut short by the Lambda's remaining time minus a safety margin.
+    """
+    seconds = budget_seconds
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        seconds = min(seconds, context.get_remaining_time_in_millis() / 1000.0 - margin_seconds)
+    return clock() + seconds
+
+
+def get_error_code(error):
+    """Return the AWS error code of an exception, or None"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def is_throttling_error(error):
+    return get_error_code(error) in THROTTLING_ERROR_CODES
+
+
+def is_retryable_error(error):
+    """Throttling, transient service errors and connection problems are retryable"""
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    code = get_error_code(error)
+    return code in THROTTLING_ERROR_CODES or code in TRANSIENT_ERROR_CODES
+
+
+class Metrics:
+    """
+    Per-container counters (and breaker states) under one CloudWatch namespace,
+    keyed by a value of `dimension`. Published as Embedded Metric Format lines
+    by emit(). They go straight to stdout: CloudWatch only extracts metrics from
+    log events that are pure JSON, and the Lambda logging handler prefixes each
+    record with level, time and request id.
+    """
+
+    def __init__(self, namespace='Chatbot/Resilience', dimension='Dependency'):
+        self.namespace = namespace
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._breakers = {}
+
+    def increment(self, dependency, name, value=1):
+        with self._lock:
+            key = (dependency, name)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_breaker(self, breaker):
+        with self._lock:
+            self._breakers[breaker.name] = breaker
+
+    def snapshot(self):
+        """Return current counters and breaker states as a plain dict"""
+        with self._lock:
+            counters = {}
+            for (dependency, name), value in self._counters.items():
+                counters.setdefault(dependency, {})[name] = value
+            breakers = {name: breaker.state for name, breaker in self._breakers.items()}
+        return {'counters': counters, 'breakers': breakers}
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+
+    def emit(self):
+        """Log one EMF record per dimension value so CloudWatch turns it into metrics"""
+        snapshot = self.snapshot()
+        timestamp = int(time.time() * 1000)
+        for dependency, counters in snapshot['counters'].items():
+            record = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [[self.dimension]],
+                        'Metrics': [{'Name': name, 'Unit': 'Count'} for name in counters]
+                    }]
+                },
+                self.dimension: dependency,
+            }
+            record.update(counters)
+            print(json.dumps(record), flush=True)
+        for name, state in snapshot['breakers'].items():
+            record = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Breaker']],
+                        'Metrics': [{'Name': 'BreakerOpen', 'Unit': 'Count'}]
+                    }]
+                },
+                'Breaker': name,
+                'BreakerState': state,
+                'BreakerOpen': 0 if state == STATE_CLOSED else 1,
+            }
+            print(json.dumps(record), flush=True)
+        self.reset()
+
+
+metrics = Metrics()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures, fails fast
+    for `reset_timeout` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic, registry=metrics):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._metrics = registry
+        if registry is not None:
+            registry.register_breaker(self)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = STATE_HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN and self._metrics is not None:
+                    self._metrics.increment(self.name, 'BreakerOpened')
+                self._state = STATE_OPEN
+                self._opened_at = self._clock()
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. An attempt only starts when at least
+    `attempt_timeout` seconds (the client's worst case for one call) are left
+    before the deadline, so retries never push a call past it. The deadline is
+    passed in as `deadline_at` or defaults to `deadline` seconds from the call.
+    With `retry_read_timeouts` off, a read timeout is not retried: the attempt
+    already used most of the time it was given.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.2, max_delay=4.0, deadline=20.0,
+                 attempt_timeout=CONNECT_TIMEOUT + KENDRA_READ_TIMEOUT, retry_read_timeouts=True,
+                 sleep=time.sleep, clock=time.monotonic, rng=random.random):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.retry_read_timeouts = retry_read_timeouts
+        self._sleep = sleep
+        self._clock = clock
+        self._rng = rng
+
+    def backoff(self, attempt):
+        return self._rng() * min(self.max_delay, self.base_delay * (2 ** attempt))
+
+    def default_deadline(self):
+        return self._clock() + self.deadline
+
+    def has_time_for_attempt(self, deadline_at, delay=0.0):
+        return self._clock() + delay + self.attempt_timeout <= deadline_at
+
+    def call(self, dependency, breaker, fn, *args, deadline_at=None, **kwargs):
+        """Call fn through the breaker, retrying retryable errors with backoff until deadline_at"""
+        if deadline_at is None:
+            deadline_at = self.default_deadline()
+        if not self.has_time_for_attempt(deadline_at):
+            metrics.increment(dependency, 'DeadlineExceeded')
+            raise DeadlineExceededError(dependency)
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                metrics.increment(dependency, 'FastFail')
+                raise CircuitOpenError(breaker.name)
+            metrics.increment(dependency, 'Calls')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    # Caller errors (validation, access denied) say nothing about service health
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                metrics.increment(dependency, 'Throttles' if is_throttling_error(e) else 'TransientErrors')
+                attempt += 1
+                delay = self.backoff(attempt)
+                if (attempt >= self.max_attempts or breaker.state == STATE_OPEN
+                        or (isinstance(e, ReadTimeoutError) and not self.retry_read_timeouts)
+                        or not self.has_time_for_attempt(deadline_at, delay)):
+                    metrics.increment(dependency, 'RetriesExhausted')
+                    raise
+                metrics.increment(dependency, 'Retries')
+                logger.warning(f"{dependency} call failed with {get_error_code(e) or type(e).__name__}, "
+                               f"retry {attempt} in {delay:.2f}s")
+                self._sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+
+def client_config(read_timeout):
+    """
+    botocore config for wrapped clients: our RetryPolicy owns retries, while
+    adaptive mode keeps botocore's client-side rate limiter on throttles.
+    botocore's `max_attempts` counts retries, so `total_max_attempts` is what
+    limits each RetryPolicy attempt to a single HTTP request.
+    """
+    return Config(
+        retries={'total_max_attempts': 1, 'mode': 'adaptive'},
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+    )
+
+
+class ResilientKendraClient:
+    """Kendra client wrapper with retry and a circuit breaker"""
+
+    dependency = 'kendra'
+
+    def __init__(self, client=None, region_name='ap-southeast-1', breaker=None, retry_policy=None):
+        self.client = client or boto3.client('kendra', region_name=region_name, config=client_config(KENDRA_READ_TIMEOUT))
+        self.breaker = breaker or CircuitBreaker(f"kendra:{region_name}")
+        self.retry_policy = retry_policy or RetryPolicy(attempt_timeout=CONNECT_TIMEOUT + KENDRA_READ_TIMEOUT)
+
+    def query(self, deadline_at=None, **kwargs):
+        return self.retry_policy.call(self.dependency, self.breaker, self.client.query, deadline_at=deadline_at, **kwargs)
+
+
+class DeadlineScaledBedrockClient:
+    """
+    bedrock-runtime client for one region whose read timeout is the time left before
+    the deadline (minus the connect timeout), capped at `max_read_timeout`. A long
+    generation can use the whole request budget without an attempt outliving it.
+    One botocore client is kept per whole-second timeout.
+    """
+
+    def __init__(self, region, max_read_timeout=BEDROCK_MAX_READ_TIMEOUT, min_read_timeout=BEDROCK_MIN_READ_TIMEOUT,
+                 clock=time.monotonic):
+        self.region = region
+        self.max_read_timeout = max_read_timeout
+        self.min_read_timeout = min_read_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    def read_timeout_for(self, deadline_at):
+        remaining = deadline_at - self._clock() - CONNECT_TIMEOUT
+        return max(self.min_read_timeout, min(self.max_read_timeout, int(remaining)))
+
+    def client_for(self, read_timeout):
+        with self._lock:
+            client = self._clients.get(read_timeout)
+            if client is None:
+                client = boto3.client('bedrock-runtime', region_name=self.region, config=client_config(read_timeout))
+                self._clients[read_timeout] = client
+            return client
+
+    def invoke_model(self, deadline_at, **kwargs):
+        return self.client_for(self.read_timeout_for(deadline_at)).invoke_model(**kwargs)
+
+
+class ResilientBedrockClient:
+    """
+    bedrock-runtime client wrapper with retry, a circuit breaker per region
+    and failover to secondary regions, tried in the order given. All regions
+    share one deadline, so failover never extends the time a request can take.
+    Read timeouts are not retried.
+    """
+
+    dependency = 'bedrock'
+
+    def __init__(self, regions, clients=None, retry_policy=None, failure_threshold=5, reset_timeout=30.0,
+                 max_read_timeout=BEDROCK_MAX_READ_TIMEOUT):
+        if not regions:
+            raise ValueError("At least one Bedrock region is required")
+        clients = clients or {}
+        self.retry_policy = retry_policy or RetryPolicy(
+            attempt_timeout=CONNECT_TIMEOUT + BEDROCK_MIN_READ_TIMEOUT, retry_read_timeouts=False)
+        self.endpoints = []
+        for region in regions:
+            client = clients.get(region) or DeadlineScaledBedrockClient(region, max_read_timeout=max_read_timeout)
+            breaker = CircuitBreaker(f"bedrock:{region}", failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+            self.endpoints.append((region, client, breaker))
+
+    def invoke_model(self, deadline_at=None, **kwargs):
+        if deadline_at is None:
+            deadline_at = self.retry_policy.default_deadline()
+        last_error = None
+        for index, (region, client, breaker) in enumerate(self.endpoints):
+            if index > 0:
+                if not self.retry_policy.has_time_for_attempt(deadline_at):
+                    break
+                metrics.increment(self.dependency, 'Failovers')
+                logger.warning(f"Failing over Bedrock call to {region}")
+            invoke = client.invoke_model
+            if isinstance(client, DeadlineScaledBedrockClient):
+                invoke = functools.partial(client.invoke_model, deadline_at)
+            try:
+                return self.retry_policy.call(self.dependency, breaker, invoke,
+                                              deadline_at=deadline_at, **kwargs)
+            except CircuitOpenError as e:
+                last_error = e
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                last_error = e
+        raise last_error
@@ -0,0 +1,282 @@
+import datetime
+import logging
+import math
+import re
+import threading
+import time
+
+import markdown
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger()
+
+# Item holding the index version, bumped by every ingest that changes entries so readers know when to reload
+META_SOURCE = '__meta__'
+META_KEY = 'version'
+
+# Keep answers compact; long sections are better served by Kendra
+MAX_ANSWER_CHARS = 4000
+
+QUESTION_WORDS = {
+    'what', 'how', 'why', 'when', 'where', 'who', 'which', 'can', 'could',
+    'do', 'does', 'is', 'are', 'should', 'will', 'would',
+}
+
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'to', 'of', 'in', 'on',
+    'for', 'and', 'or', 'do', 'does', 'did', 'i', 'you', 'we', 'it', 'my',
+    'your', 'our', 'can', 'could', 'should', 'would', 'will', 'me', 'with',
+    'what', 'how', 'which', 'that', 'this', 'there', 'about',
+}
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+QUESTION_LINE_RE = re.compile(r'^\s*(?:\*\*|__)?(?:Q|Question)\s*[:.](?:\*\*|__)?\s*(.+?)\s*(?:\*\*|__)?\s*$', re.IGNORECASE)
+ANSWER_LINE_RE = re.compile(r'^\s*(?:\*\*|__)?(?:A|Answer)\s*[:.](?:\*\*|__)?\s*(.*)$', re.IGNORECASE)
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace to build a lookup key"""
+    return ' '.join(NON_WORD_RE.sub(' ', text.lower()).split())
+
+
+def tokenize(text):
+    """Content tokens of a question, used for the fuzzy token index"""
+    return frozenset(t for t in normalize_question(text).split() if t not in STOPWORDS)
+
+
+def is_question_like(text):
+    words = normalize_question(text).split()
+    return text.rstrip().endswith('?') or (bool(words) and words[0] in QUESTION_WORDS)
+
+
+def markdown_to_text(md_content):
+    html_content = markdown.markdown(md_content)
+    return BeautifulSoup(html_content, 'html.parser').get_text().strip()
+
+
+def extract_faq_entries(md_content):
+    """
+    Extract question-like headings and explicit Q:/A: pairs with their answer bodies.
+    Returns a list of {'question': ..., 'answer': ...} dicts with plain-text answers.
+
+    A question heading's answer runs until the next heading at the same or a higher
+    level. Deeper headings stay part of the answer, except deeper question headings:
+    those end the enclosing answer and become entries of their own.
+    """
+    entries = []
+    current = None  # (kind, heading level or None, question, body lines)
+    in_fence = False
+
+    def flush():
+        if current is None:
+            return
+        answer = markdown_to_text('\n'.join(current[3]))[:MAX_ANSWER_CHARS]
+        if answer:
+            entries.append({'question': current[2], 'answer': answer})
+
+    for line in md_content.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_RE.match(line)
+        question_line = None if in_fence else QUESTION_LINE_RE.match(line)
+
+        if heading:
+            level = len(heading.group(1))
+            title = heading.group(2)
+            question_like = is_question_like(title)
+            # A deeper non-question heading is part of the current answer; anything else ends it
+            if current is not None and current[0] == 'heading' and level > current[1] and not question_like:
+                current[3].append(line)
+                continue
+            flush()
+            current = ('heading', level, title, []) if question_like else None
+        elif question_line:
+            flush()
+            current = ('qa', None, question_line.group(1), [])
+        elif current is not None and current[0] == 'qa' and not in_fence and not line.strip() and any(l.strip() for l in current[3]):
+            # Q:/A: answers end at the first blank line after the answer text
+            flush()
+            current = None
+        elif current is not None:
+            answer_line = ANSWER_LINE_RE.match(line) if current[0] == 'qa' and not in_fence else None
+            current[3].append(answer_line.group(1) if answer_line else line)
+    flush()
+    return entries
+
+
+def sync_faq_entries(table, source, entries):
+    """
+    Replace the FAQ entries of one source file in DynamoDB. Entries from other files
+    are untouched, so ingest updates the index incrementally. Only new or changed
+    entries are written, and the index version is only bumped when something changed.
+    """
+    timestamp = datetime.datetime.now().isoformat()
+    items = {}
+    for entry in entries:
+        key = normalize_question(entry['question'])
+        if key:
+            items[key] = {
+                'source': source,
+                'question_key': key,
+                'question': entry['question'],
+                'answer': entry['answer'],
+                'updated_at': timestamp,
+            }
+
+    existing = {}
+    query_kwargs = {
+        'KeyConditionExpression': '#source = :source',
+        'ExpressionAttributeNames': {'#source': 'source', '#key': 'question_key', '#q': 'question', '#a': 'answer'},
+        'ExpressionAttributeValues': {':source': source},
+        'ProjectionExpression': '#key, #q, #a',
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        existing.update((item['question_key'], item) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    removed = set(existing) - set(items)
+    changed = [
+        item for key, item in items.items()
+        if key not in existing
+        or existing[key].get('question') != item['question']
+        or existing[key].get('answer') != item['answer']
+    ]
+    if not removed and not changed:
+        logger.info(f"FAQ entries for {source} unchanged ({len(items)} entries)")
+        return len(items)
+
+    with table.batch_writer() as batch:
+        for key in removed:
+            batch.delete_item(Key={'source': source, 'question_key': key})
+        for item in changed:
+            batch.put_item(Item=item)
+
+    table.update_item(
+        Key={'source': META_SOURCE, 'question_key': META_KEY},
+        UpdateExpression='ADD #version :one',
+        ExpressionAttributeNames={'#version': 'version'},
+        ExpressionAttributeValues={':one': 1},
+    )
+    logger.info(f"Synced FAQ entries for {source}: {len(changed)} written, {len(removed)} removed")
+    return len(items)
+
+
+class FAQIndex:
+    """
+    In-memory FAQ lookup loaded from DynamoDB and kept for the life of the container.
+    Exact hits use the normalized key; near hits go through a token -> keys index.
+    The version item is checked every `refresh_seconds`, and the table is only
+    rescanned when an ingest has changed it.
+    """
+
+    def __init__(self, table, refresh_seconds=300, min_similarity=0.75, clock=time.monotonic):
+        self.table = table
+        self.refresh_seconds = refresh_seconds
+        self.min_similarity = min_similarity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._index = ({}, {})  # (entries, token -> {token count -> keys}), swapped as one object on reload
+        self._version = None
+        self._loaded = False
+        self._checked_at = None
+
+    def load(self, items):
+        """Build the lookup structures from FAQ items"""
+        entries = {}
+        for item in sorted(items, key=lambda x: x.get('updated_at', '')):
+            # Newest wins when two files define the same question
+            entries[item['question_key']] = (item['answer'], item['source'], tokenize(item['question']))
+        token_index = {}
+        for key, (_, _, tokens) in entries.items():
+            for token in tokens:
+                token_index.setdefault(token, {}).setdefault(len(tokens), []).append(key)
+        self._index = (entries, token_index)
+
+    def refresh(self):
+        """Reload from DynamoDB if the index version changed since the last load"""
+        response = self.table.get_item(Key={'source': META_SOURCE, 'question_key': META_KEY})
+        version = response.get('Item', {}).get('version')
+        if self._loaded and version == self._version:
+            self._checked_at = self._clock()
+            return
+        items = []
+        scan_kwargs = {}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            items.extend(item for item in response.get('Items', []) if item['source'] != META_SOURCE)
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        self.load(items)
+        self._version = version
+        self._loaded = True
+        self._checked_at = self._clock()
+        logger.info(f"Loaded {len(self._index[0])} FAQ entries (version {version})")
+
+    def preload(self):
+        """Load the index up front (at module init); errors are logged and retried on lookup"""
+        with self._lock:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error loading FAQ index: {str(e)}")
+
+    def _ensure_fresh(self):
+        now = self._clock()
+        if self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the index we have; Kendra still answers on a miss
+                logger.error(f"Error refreshing FAQ index: {str(e)}")
+            self._checked_at = now
+
+    def lookup(self, question):
+        """Return (answer, source) for a matching FAQ entry, or None"""
+        self._ensure_fresh()
+        entries, token_index = self._index
+        entry = entries.get(normalize_question(question))
+        if entry is not None:
+            return entry[0], entry[1]
+
+        tokens = tokenize(question)
+        best_key, best_score = None, 0.0
+        for key in self.candidates(tokens):
+            entry_tokens = entries[key][2]
+            score = len(tokens & entry_tokens) / len(tokens | entry_tokens)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key is not None and best_score >= self.min_similarity:
+            return entries[best_key][0], entries[best_key][1]
+        return None
+
+    def candidates(self, tokens):
+        """
+        Keys that could reach `min_similarity` with `tokens`. A match must have between
+        min_similarity * |q| and |q| / min_similarity tokens and share at least
+        ceil(min_similarity * |q|) of them with the question, so it must contain one of
+        the question's |q| - ceil(min_similarity * |q|) + 1 rarest tokens. Only those
+        tokens' keys of a matching size are scanned; common tokens are skipped.
+        """
+        if not tokens:
+            return set()
+        _, token_index = self._index
+        # Small epsilons keep float rounding from dropping a size or a shared token that is exactly on the bound
+        min_size = math.ceil(self.min_similarity * len(tokens) - 1e-9)
+        max_size = math.floor(len(tokens) / self.min_similarity + 1e-9)
+        rarest = sorted(tokens, key=lambda t: sum(len(keys) for keys in token_index.get(t, {}).values()))
+        keys = set()
+        for token in rarest[:len(tokens) - min_size + 1]:
+            by_size = token_index.get(token, {})
+            for size in range(max(min_size, 1), max_size + 1):
+                keys.update(by_size.get(size, ()))
+        return keys
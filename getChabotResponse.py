@@ -3,28 +3,78 @@ import json
 import logging
 import markdown
 import datetime
+import os
 from bs4 import BeautifulSoup
+from awsResilience import (
+    CONNECT_TIMEOUT,
+    MIN_REQUEST_SECONDS,
+    Metrics,
+    ResilientBedrockClient,
+    ResilientKendraClient,
+    ServiceUnavailableError,
+    deadline_from_context,
+    is_retryable_error,
+    metrics,
+)
+from faqIndex import FAQIndex
+from sessionCache import SessionHistoryCache
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
 
 # Connect to AWS services
-kendra_client = boto3.client('kendra', region_name='ap-southeast-1')
+kendra_client = ResilientKendraClient(region_name='ap-southeast-1')
 kendra_index_id = '1c088278-9865-482f-a9bd-02403d6e9fd0'
 
-# Use bedrock-runtime with Claude 3.5 Sonnet
-bedrock_runtime_client = boto3.client('bedrock-runtime', region_name='ap-southeast-1')
+# Time budget for the AWS calls of one request, kept under API Gateway's 29 s integration timeout
+request_budget_seconds = float(os.environ.get('REQUEST_BUDGET_SECONDS', '25'))
+if request_budget_seconds < MIN_REQUEST_SECONDS:
+    logger.warning(f"REQUEST_BUDGET_SECONDS={request_budget_seconds} is below {MIN_REQUEST_SECONDS}s; "
+                   f"questions Kendra can't answer may get 503 without calling Bedrock")
+# Warn once per container if the Lambda timeout is too short (only visible from the first invocation's context)
+lambda_timeout_checked = False
+
+# Use bedrock-runtime with Claude 3.5 Sonnet, failing over to BEDROCK_FAILOVER_REGIONS (comma separated).
+# Bedrock's read timeout may use the whole request budget, since Claude can take that long for 1000 tokens.
+bedrock_regions = ['ap-southeast-1'] + [r.strip() for r in os.environ.get('BEDROCK_FAILOVER_REGIONS', '').split(',') if r.strip()]
+bedrock_runtime_client = ResilientBedrockClient(bedrock_regions, max_read_timeout=int(request_budget_seconds - CONNECT_TIMEOUT))
 bedrock_model_id = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
 
 # DynamoDB for conversation memory
 dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-1')
 conversation_table = dynamodb.Table('ChatbotMemory') 
 
+# Recent turns per session, kept across warm invocations so most turns skip the DynamoDB read
+session_cache = SessionHistoryCache(
+    max_bytes=int(os.environ.get('SESSION_CACHE_MAX_BYTES', str(16 * 1024 * 1024))),
+    max_turns=3,
+    ttl_seconds=int(os.environ.get('SESSION_CACHE_TTL_SECONDS', '900'))
+)
+cache_metrics = Metrics(namespace='Chatbot/SessionCache', dimension='Cache')
+
+# Precomputed FAQ entries extracted at ingest time, held in memory for the container's lifetime
+faq_index = FAQIndex(
+    dynamodb.Table(os.environ.get('FAQ_TABLE_NAME', 'ChatbotFAQ')),
+    refresh_seconds=int(os.environ.get('FAQ_REFRESH_SECONDS', '300'))
+)
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    # Load during cold-start init rather than inside the first request
+    faq_index.preload()
+
 # Lambda function to call SendToTelegram Lambda
 lambda_client = boto3.client('lambda')
 
 def lambda_handler(event, context):
+    global lambda_timeout_checked
+    if not lambda_timeout_checked and context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        lambda_timeout_checked = True
+        if context.get_remaining_time_in_millis() / 1000.0 < MIN_REQUEST_SECONDS + 1:
+            logger.warning(f"Lambda timeout is below {MIN_REQUEST_SECONDS + 1}s; "
+                           f"questions Kendra can't answer may get 503 without calling Bedrock")
+
+    # One deadline shared by every Kendra/Bedrock attempt and failover in this invocation
+    deadline_at = deadline_from_context(context, request_budget_seconds)
     try:
         logger.info(f"Received event: {json.dumps(event)}")
         
@@ -58,95 +108,111 @@ def lambda_handler(event, context):
         if not question:
             raise ValueError("Could not find 'question' in the request")
 
-        # Retrieve previous conversations for this session to build context
-        previous_conversations = get_previous_conversations(session_id, limit=3)
-        logger.info(f"Retrieved {len(previous_conversations)} previous conversations")
-        
-        # Initialize context for memory
-        context = ""
-        if previous_conversations:
-            context = "Previous conversation:\n"
-            for conv in previous_conversations:
-                context += f"User: {conv['question']}\nAssistant: {conv['answer']}\n\n"
+        # Answer straight from the FAQ index when the question matches an extracted FAQ entry;
+        # FAQ answers don't use conversation history, so hits skip the history read too
+        faq_hit = faq_index.lookup(question)
+        if faq_hit:
+            answer, faq_source = faq_hit
+            logger.info(f"Answered from FAQ index ({faq_source})")
+            source = "faq"
+        else:
+            # Retrieve previous conversations for this session to build context
+            previous_conversations = get_previous_conversations(session_id, limit=3)
+            logger.info(f"Retrieved {len(previous_conversations)} previous conversations")
             
-            logger.info(f"Built context from previous conversations: {context[:100]}...")
-
-        #1. Query Kendra for answers
-        response = kendra_client.query(
-            IndexId=kendra_index_id,
-            QueryText=question,
-            PageSize=5,
-            AttributeFilter={
-                "EqualsTo": {
-                    "Key": "_language_code",
-                    "Value": {
-                        "StringValue": "en"
+            # Initialize context for memory
+            context = ""
+            if previous_conversations:
+                context = "Previous conversation:\n"
+                for conv in previous_conversations:
+                    context += f"User: {conv['question']}\nAssistant: {conv['answer']}\n\n"
+                
+                logger.info(f"Built context from previous conversations: {context[:100]}...")
+
+            #1. Query Kendra for answers, falling through to Claude if Kendra is unavailable
+            try:
+                response = kendra_client.query(
+                    deadline_at=deadline_at,
+                    IndexId=kendra_index_id,
+                    QueryText=question,
+                    PageSize=5,
+                    AttributeFilter={
+                        "EqualsTo": {
+                            "Key": "_language_code",
+                            "Value": {
+                                "StringValue": "en"
+                            }
+                        }
                     }
-                }
-            }
-        )
+                )
+            except Exception as e:
+                if not isinstance(e, ServiceUnavailableError) and not is_retryable_error(e):
+                    raise
+                logger.warning(f"Kendra unavailable, skipping knowledge base: {str(e)}")
+                response = {}
         
-        # Check if there are results from Kendra
-        if 'ResultItems' in response and len(response['ResultItems']) > 0:
-            result_item = response['ResultItems'][0]
-            answer = result_item.get('DocumentExcerpt', {}).get('Text', 'No answer found.')
-
-            # Process Markdown if present in answer from Kendra
-            if answer:
-                html_content = markdown.markdown(answer)
-                soup = BeautifulSoup(html_content, 'html.parser')
-                answer = soup.get_text()
+            # Check if there are results from Kendra
+            if 'ResultItems' in response and len(response['ResultItems']) > 0:
+                result_item = response['ResultItems'][0]
+                answer = result_item.get('DocumentExcerpt', {}).get('Text', 'No answer found.')
+
+                # Process Markdown if present in answer from Kendra
+                if answer:
+                    html_content = markdown.markdown(answer)
+                    soup = BeautifulSoup(html_content, 'html.parser')
+                    answer = soup.get_text()
                 
-            source = "kendra"
-        else:
-            # If there's no result from Kendra, call Claude 3.5 Sonnet
-            logger.info("No results from Kendra, calling Claude 3.5 Sonnet...")
+                source = "kendra"
+            else:
+                # If there's no result from Kendra, call Claude 3.5 Sonnet
+                logger.info("No results from Kendra, calling Claude 3.5 Sonnet...")
             
-            # Include context from previous conversations if available
-            prompt = question
-            if context:
-                prompt = f"{context}\n\nNew Question: {question}\n\nPlease respond to the new question using the context of our previous conversation when relevant."
+                # Include context from previous conversations if available
+                prompt = question
+                if context:
+                    prompt = f"{context}\n\nNew Question: {question}\n\nPlease respond to the new question using the context of our previous conversation when relevant."
             
-            # Config requirements Claude 3.5 Sonnet
-            request_body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
+                # Config requirements Claude 3.5 Sonnet
+                request_body = {
+                    "anthropic_version": "bedrock-2023-05-31",
+                    "max_tokens": 1000,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": prompt
+                                }
+                            ]
+                        }
+                    ]
+                }
 
-            # Send request to Claude 3.5 Sonnet API
-            response = bedrock_runtime_client.invoke_model(
-                modelId=bedrock_model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps(request_body)
-            )
+                # Send request to Claude 3.5 Sonnet API
+                response = bedrock_runtime_client.invoke_model(
+                    deadline_at=deadline_at,
+                    modelId=bedrock_model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=json.dumps(request_body)
+                )
 
-            # Check and process result from Claude 3.5 Sonnet
-            if response and 'body' in response:
-                response_body = response['body'].read().decode('utf-8')
-                logger.info(f"Raw Claude response: {response_body}")
+                # Check and process result from Claude 3.5 Sonnet
+                if response and 'body' in response:
+                    response_body = response['body'].read().decode('utf-8')
+                    logger.info(f"Raw Claude response: {response_body}")
                 
-                result = json.loads(response_body)
-                if 'content' in result and len(result['content']) > 0:
-                    answer = result['content'][0].get('text', 'No answer found')
-                else:
-                    answer = "No answer found from Claude 3.5 Sonnet."
+                    result = json.loads(response_body)
+                    if 'content' in result and len(result['content']) > 0:
+                        answer = result['content'][0].get('text', 'No answer found')
+                    else:
+                        answer = "No answer found from Claude 3.5 Sonnet."
                     
-                source = "claude"
-            else:
-                answer = "No relevant information found in the knowledge base."
-                source = "none"
+                    source = "claude"
+                else:
+                    answer = "No relevant information found in the knowledge base."
+                    source = "none"
 
         # Store the conversation in DynamoDB
         store_conversation(session_id, question, answer, source)
@@ -180,6 +246,20 @@ def lambda_handler(event, context):
         }
     
     except Exception as e:
+        if isinstance(e, ServiceUnavailableError) or is_retryable_error(e):
+            # Throttled, breaker open or out of time: tell the client to retry later instead of a generic error
+            logger.error(f"Service unavailable: {str(e)}")
+            return {
+                'statusCode': 503,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Content-Type': 'application/json',
+                    'Retry-After': '30'
+                },
+                'body': json.dumps({
+                    'response': "The assistant is busy right now. Please try again in a moment."
+                })
+            }
         logger.error(f"Error: {str(e)}")
         return {
             'statusCode': 500,
@@ -191,10 +271,14 @@ def lambda_handler(event, context):
                 'response': f"An error occurred while processing your question: {str(e)}"
             })
         }
+    finally:
+        # Publish retry, throttle, breaker and session cache metrics for this invocation
+        metrics.emit()
+        cache_metrics.emit()
 
 def store_conversation(session_id, question, answer, source):
     """
-    Store a conversation in DynamoDB
+    Store a conversation in DynamoDB and write it through to the session cache
     """
     try:
         timestamp = datetime.datetime.now().isoformat()
@@ -207,6 +291,7 @@ def store_conversation(session_id, question, answer, source):
                 'source': source
             }
         )
+        session_cache.append(session_id, {'question': question, 'answer': answer, 'timestamp': timestamp})
         return True
     except Exception as e:
         logger.error(f"Error storing conversation in DynamoDB: {str(e)}")
@@ -214,19 +299,31 @@ def store_conversation(session_id, question, answer, source):
 
 def get_previous_conversations(session_id, limit=3):
     """
-    Retrieve previous conversations from DynamoDB
+    Retrieve previous conversations from the session cache, or DynamoDB on a miss
     Returns a list of conversation items ordered by timestamp (most recent last)
     """
+    if limit <= session_cache.max_turns:
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            cache_metrics.increment('session_history', 'Hits')
+            return cached[-limit:] if limit else []
+        cache_metrics.increment('session_history', 'Misses')
+
     try:
+        # Only fetch the fields the prompt needs; answers can be long and source is unused here
         response = conversation_table.query(
             KeyConditionExpression=boto3.dynamodb.conditions.Key('session_id').eq(session_id),
+            ProjectionExpression='#q, #a, #ts',
+            ExpressionAttributeNames={'#q': 'question', '#a': 'answer', '#ts': 'timestamp'},
             ScanIndexForward=False,  # Sort by timestamp in descending order (newest first)
-            Limit=limit
+            Limit=max(limit, session_cache.max_turns)
         )
         
-        # Return conversations in chronological order (oldest first)
+        # Items come back newest first; reverse for chronological order (oldest first)
         if 'Items' in response:
-            return sorted(response['Items'], key=lambda x: x.get('timestamp', ''))
+            items = response['Items'][::-1]
+            session_cache.put(session_id, items)
+            return items[-limit:] if limit else []
         return []
     except Exception as e:
         logger.error(f"Error retrieving conversations from DynamoDB: {str(e)}")
@@ -0,0 +1,453 @@
+"""
+Load-test driver for getChabotResponse.lambda_handler.
+
+Replays a question corpus (or a synthetic Zipf-distributed one) against the
+handler at a fixed arrival rate, with Kendra, DynamoDB and Bedrock replaced by
+local stand-ins that sleep for a configurable latency and can inject throttling.
+The resilience layer in awsResilience.py stays in place, so retries, breakers
+and failover behave as they would against the real services.
+
+Like Lambda, each concurrent invocation runs in its own "container": a separate
+copy of the handler module with its own session cache, FAQ index and circuit
+breakers. Requests go to whichever container is idle, with no session affinity.
+The stand-in DynamoDB tables are shared by all containers.
+
+Example:
+    python loadTest.py --qps 20 --concurrency 10 --duration 30 --zipf 1.1 \\
+        --bedrock-ms 1200,4000 --bedrock-throttle 0.05
+"""
+import argparse
+import bisect
+import importlib.util
+import io
+import json
+import logging
+import math
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+# getChabotResponse creates its clients at import time; they only need a region
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-southeast-1')
+
+from awsResilience import Metrics, metrics  # noqa: E402
+
+HANDLER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'getChabotResponse.py')
+
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class LatencyModel:
+    """Log-normal latency given its median and p99 in milliseconds, plus a throttle rate"""
+
+    def __init__(self, median_ms, p99_ms, throttle_rate=0.0, rng=None):
+        self.median_ms = median_ms
+        self.sigma = math.log(p99_ms / median_ms) / 2.326 if p99_ms > median_ms > 0 else 0.0
+        self.throttle_rate = throttle_rate
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec, throttle_rate=0.0):
+        """Parse 'median' or 'median,p99' (milliseconds)"""
+        parts = [float(p) for p in spec.split(',')]
+        if len(parts) > 2 or parts[0] < 0:
+            raise ValueError(f"expected median[,p99] in ms with median >= 0, got {spec!r}")
+        p99 = parts[1] if len(parts) > 1 else parts[0]
+        if p99 < parts[0]:
+            raise ValueError(f"p99 ({p99:g} ms) is below the median ({parts[0]:g} ms)")
+        return cls(parts[0], p99, throttle_rate)
+
+    def wait(self, operation):
+        """Sleep for one sampled latency, then raise a throttling error if one is drawn"""
+        if self.median_ms > 0:
+            time.sleep(self.rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000.0)
+        if self.throttle_rate and self.rng.random() < self.throttle_rate:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation)
+
+
+class StandInStats:
+    """Call counts and time spent per stand-in dependency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.seconds = {}
+        self.throttles = {}
+
+    def record(self, name, seconds, throttled):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            if throttled:
+                self.throttles[name] = self.throttles.get(name, 0) + 1
+
+    def timed(self, name, model, operation):
+        started = time.perf_counter()
+        throttled = False
+        try:
+            model.wait(operation)
+        except ClientError:
+            throttled = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, throttled)
+
+
+class KendraStandIn:
+    def __init__(self, model, stats, hit_rate):
+        self.model = model
+        self.stats = stats
+        self.hit_rate = hit_rate
+
+    def query(self, **kwargs):
+        self.stats.timed('kendra', self.model, 'Query')
+        if self.model.rng.random() < self.hit_rate:
+            return {'ResultItems': [{'DocumentExcerpt': {'Text': f"Excerpt about **{kwargs.get('QueryText', '')}**"}}]}
+        return {'ResultItems': []}
+
+
+class BedrockStandIn:
+    def __init__(self, model, stats, region):
+        self.model = model
+        self.stats = stats
+        self.region = region
+
+    def invoke_model(self, **kwargs):
+        self.stats.timed(f"bedrock:{self.region}", self.model, 'InvokeModel')
+        body = {'content': [{'type': 'text', 'text': 'Synthetic answer ' + 'lorem ipsum ' * 40}]}
+        return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+
+class TableStandIn:
+    """In-memory DynamoDB table covering the calls the handler and FAQ index make (FAQ table is empty)"""
+
+    def __init__(self, model, stats, name):
+        self.model = model
+        self.stats = stats
+        self.name = name
+        self._lock = threading.Lock()
+        self._items = {}  # partition key value -> list of items
+
+    def put_item(self, Item):
+        self.stats.timed(f"dynamodb:{self.name}", self.model, 'PutItem')
+        with self._lock:
+            self._items.setdefault(Item['session_id'], []).append(dict(Item))
+
+    def query(self, KeyConditionExpression=None, ScanIndexForward=True, Limit=None, ProjectionExpression=None, **kwargs):
+        self.stats.timed(f"dynamodb:{self.name}", self.model, 'Query')
+        partition = KeyConditionExpression.get_expression()['values'][1]
+        with self._lock:
+            items = sorted(self._items.get(partition, []), key=lambda x: x.get('timestamp', ''), reverse=not ScanIndexForward)
+        if Limit:
+            items = items[:Limit]
+        if ProjectionExpression:
+            names = kwargs.get('ExpressionAttributeNames', {})
+            fields = [names.get(f.strip(), f.strip()) for f in ProjectionExpression.split(',')]
+            items = [{f: item[f] for f in fields if f in item} for item in items]
+        return {'Items': items}
+
+    def get_item(self, Key):
+        self.stats.timed(f"dynamodb:{self.name}", self.model, 'GetItem')
+        return {}
+
+    def scan(self, **kwargs):
+        self.stats.timed(f"dynamodb:{self.name}", self.model, 'Scan')
+        return {'Items': []}
+
+
+class LambdaStandIn:
+    def invoke(self, **kwargs):
+        return {'StatusCode': 202}
+
+
+class RunMetrics:
+    """Stops the handler from emitting (and resetting) a metrics registry after every request"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def emit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.registry, name)
+
+
+def load_container(index):
+    """Load a fresh copy of the handler module, as a new Lambda container would"""
+    spec = importlib.util.spec_from_file_location(f"getChabotResponse_container{index}", HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def install_stand_ins(container, args, stats, tables, cache_registry):
+    """Swap a container's AWS clients for stand-ins, keeping the resilience wrappers"""
+    container.kendra_client.client = KendraStandIn(
+        LatencyModel.parse(args.kendra_ms, args.kendra_throttle), stats, args.kendra_hit_rate)
+    container.bedrock_runtime_client.endpoints = [
+        (region, BedrockStandIn(LatencyModel.parse(args.bedrock_ms, args.bedrock_throttle), stats, region), breaker)
+        for region, _, breaker in container.bedrock_runtime_client.endpoints
+    ]
+    container.conversation_table = tables['ChatbotMemory']
+    container.faq_index.table = tables['ChatbotFAQ']
+    container.lambda_client = LambdaStandIn()
+    container.metrics = RunMetrics(metrics)
+    container.cache_metrics = RunMetrics(cache_registry)
+
+
+def breaker_states(containers):
+    """Count containers per breaker state, e.g. {'bedrock:ap-southeast-1': {'closed': 9, 'open': 1}}"""
+    states = {}
+    for container in containers:
+        breakers = [container.kendra_client.breaker] + [b for _, _, b in container.bedrock_runtime_client.endpoints]
+        for breaker in breakers:
+            counts = states.setdefault(breaker.name, {})
+            counts[breaker.state] = counts.get(breaker.state, 0) + 1
+    return states
+
+
+def load_corpus(path):
+    """Read questions from .jsonl ('question' or 'title' fields), a JSON event/list, or plain lines"""
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    if path.lower().endswith('.jsonl'):
+        records = [json.loads(line) for line in content.splitlines() if line.strip()]
+    elif path.lower().endswith('.json'):
+        data = json.loads(content)
+        records = data if isinstance(data, list) else [data]
+    else:
+        return [line.strip() for line in content.splitlines() if line.strip()]
+    questions = []
+    for record in records:
+        if isinstance(record, str):
+            questions.append(record)
+        elif isinstance(record, dict) and (record.get('question') or record.get('title')):
+            questions.append(record.get('question') or record.get('title'))
+    return questions
+
+
+class QuestionSampler:
+    """Draws questions with Zipf(s) popularity by rank; s=0 is uniform"""
+
+    def __init__(self, questions, s, rng):
+        self.questions = questions
+        self.rng = rng
+        total = 0.0
+        self.cumulative = []
+        for rank in range(1, len(questions) + 1):
+            total += 1.0 / (rank ** s)
+            self.cumulative.append(total)
+
+    def sample(self):
+        return self.questions[bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(math.ceil(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    stats = StandInStats()
+    dynamodb_model = LatencyModel.parse(args.dynamodb_ms, args.dynamodb_throttle)
+    tables = {name: TableStandIn(dynamodb_model, stats, name) for name in ('ChatbotMemory', 'ChatbotFAQ')}
+    cache_registry = Metrics(namespace='Chatbot/SessionCache', dimension='Cache')
+    containers = []
+    for index in range(args.concurrency):
+        container = load_container(index)
+        install_stand_ins(container, args, stats, tables, cache_registry)
+        containers.append(container)
+    idle_containers = queue.Queue()
+    for container in containers:
+        idle_containers.put(container)
+
+    if args.corpus:
+        questions = load_corpus(args.corpus)
+        if not questions:
+            raise ValueError(f"No questions found in {args.corpus}")
+    else:
+        questions = [f"Synthetic question {rank} about topic {rank % 17}?" for rank in range(1, args.unique_questions + 1)]
+    sampler = QuestionSampler(questions, args.zipf, rng)
+    sessions = [f"loadtest-{uuid.uuid4()}" for _ in range(args.sessions)]
+
+    total_requests = args.requests or int(args.qps * args.duration)
+    results = []
+    results_lock = threading.Lock()
+
+    def invoke(question, session_id, scheduled_at):
+        # One worker per container, so an idle container is always available here
+        container = idle_containers.get()
+        started = time.perf_counter()
+        try:
+            response = container.lambda_handler({'question': question, 'session_id': session_id}, None)
+            status = response.get('statusCode', 0)
+        except Exception:
+            status = 'exception'
+        finally:
+            idle_containers.put(container)
+        finished = time.perf_counter()
+        with results_lock:
+            results.append((status, finished - scheduled_at, finished - started))
+
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for i in range(total_requests):
+            # Open-loop arrivals: requests are issued on schedule even if workers are busy
+            scheduled_at = run_started + i / args.qps
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(invoke, sampler.sample(), rng.choice(sessions), scheduled_at)
+    elapsed = time.perf_counter() - run_started
+
+    return build_report(results, elapsed, stats, args, containers, cache_registry)
+
+
+def build_report(results, elapsed, stats, args, containers, cache_registry):
+    latencies_ms = sorted(r[1] * 1000 for r in results)
+    service_ms = sorted(r[2] * 1000 for r in results)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if status != '200')
+
+    histogram = []
+    lower = 0
+    for upper in HISTOGRAM_BUCKETS_MS + [float('inf')]:
+        count = sum(1 for v in latencies_ms if lower <= v < upper)
+        histogram.append({'le_ms': upper if upper != float('inf') else 'inf', 'count': count})
+        lower = upper
+
+    return {
+        'config': {
+            'qps': args.qps,
+            'concurrency': args.concurrency,
+            'requests': len(results),
+            'zipf': args.zipf,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / len(results), 4) if results else 0.0,
+        'status_counts': statuses,
+        'latency_ms': {
+            'p50': round(percentile(latencies_ms, 50), 1),
+            'p90': round(percentile(latencies_ms, 90), 1),
+            'p99': round(percentile(latencies_ms, 99), 1),
+            'max': round(latencies_ms[-1], 1) if latencies_ms else 0.0,
+        },
+        'service_ms': {
+            'p50': round(percentile(service_ms, 50), 1),
+            'p99': round(percentile(service_ms, 99), 1),
+        },
+        'histogram': histogram,
+        'dependencies': {
+            name: {
+                'calls': calls,
+                'avg_ms': round(stats.seconds[name] / calls * 1000, 1),
+                'throttles': stats.throttles.get(name, 0),
+            }
+            for name, calls in sorted(stats.calls.items())
+        },
+        'resilience': {
+            'counters': metrics.snapshot()['counters'],
+            'breakers': breaker_states(containers),
+        },
+        'session_cache': cache_registry.snapshot()['counters'],
+        'notes': [
+            f"{len(containers)} simulated containers, each with its own session cache, FAQ index and breakers",
+            "requests go to any idle container with no session affinity, as with Lambda",
+            "cold starts and init time are not modeled; containers are warm before the run starts",
+        ],
+    }
+
+
+def print_report(report):
+    print(f"Requests: {report['config']['requests']} in {report['elapsed_s']}s "
+          f"(target {report['config']['qps']} qps, concurrency {report['config']['concurrency']})")
+    print(f"Throughput: {report['throughput_rps']} req/s, error rate: {report['error_rate']:.2%}")
+    print(f"Status codes: {report['status_counts']}")
+    latency = report['latency_ms']
+    print(f"Latency incl. queueing (ms): p50={latency['p50']} p90={latency['p90']} p99={latency['p99']} max={latency['max']}")
+    print(f"Handler time (ms): p50={report['service_ms']['p50']} p99={report['service_ms']['p99']}")
+    print("Latency histogram:")
+    total = max(1, report['config']['requests'])
+    for bucket in report['histogram']:
+        bar = '#' * int(50 * bucket['count'] / total)
+        print(f"  < {str(bucket['le_ms']):>6} ms {bucket['count']:>7} {bar}")
+    print("Dependencies:")
+    for name, dep in report['dependencies'].items():
+        print(f"  {name:<22} calls={dep['calls']:<7} avg={dep['avg_ms']}ms throttles={dep['throttles']}")
+    print(f"Resilience: {json.dumps(report['resilience'])}")
+    print(f"Session cache: {json.dumps(report['session_cache'])}")
+    print("Notes:")
+    for note in report['notes']:
+        print(f"  - {note}")
+
+
+def positive_number(cast):
+    def parse(value):
+        number = cast(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+        return number
+    return parse
+
+
+def probability(value):
+    number = float(value)
+    if not 0.0 <= number <= 1.0:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 1, got {value}")
+    return number
+
+
+def latency_spec(value):
+    try:
+        LatencyModel.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test getChabotResponse.lambda_handler against local stand-ins")
+    parser.add_argument('--corpus', help="Question file (.jsonl, .json or one question per line); synthetic if omitted")
+    parser.add_argument('--unique-questions', type=positive_number(int), default=500, help="Size of the synthetic corpus")
+    parser.add_argument('--zipf', type=float, default=1.0, help="Zipf exponent for question popularity (0 = uniform)")
+    parser.add_argument('--qps', type=positive_number(float), default=10.0, help="Target arrival rate")
+    parser.add_argument('--concurrency', type=positive_number(int), default=10,
+                        help="Concurrent handler invocations, each in its own simulated container")
+    parser.add_argument('--duration', type=positive_number(float), default=30.0, help="Run length in seconds")
+    parser.add_argument('--requests', type=positive_number(int), help="Total requests (overrides --duration)")
+    parser.add_argument('--sessions', type=positive_number(int), default=50, help="Number of distinct session ids")
+    parser.add_argument('--kendra-ms', type=latency_spec, default='80,300', help="Kendra latency median[,p99] in ms")
+    parser.add_argument('--kendra-throttle', type=probability, default=0.0, help="Kendra throttle probability")
+    parser.add_argument('--kendra-hit-rate', type=probability, default=0.5, help="Fraction of Kendra queries with results")
+    parser.add_argument('--dynamodb-ms', type=latency_spec, default='8,40', help="DynamoDB latency median[,p99] in ms")
+    parser.add_argument('--dynamodb-throttle', type=probability, default=0.0, help="DynamoDB throttle probability")
+    parser.add_argument('--bedrock-ms', type=latency_spec, default='1500,5000', help="Bedrock latency median[,p99] in ms")
+    parser.add_argument('--bedrock-throttle', type=probability, default=0.0, help="Bedrock throttle probability")
+    parser.add_argument('--seed', type=int, help="Random seed for question and session selection")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # The handler logs every request at INFO; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -7,6 +7,7 @@ import os
 import uuid
 import base64
 from datetime import datetime
+from faqIndex import extract_faq_entries, sync_faq_entries
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +17,10 @@ logger = logging.getLogger()
 kendra_client = boto3.client('kendra', region_name='ap-southeast-1')
 s3_client = boto3.client('s3')
 
+# Precomputed FAQ lookup consulted by getChabotResponse before Kendra
+dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-1')
+faq_table = dynamodb.Table(os.environ.get('FAQ_TABLE_NAME', 'ChatbotFAQ'))
+
 # Configure Kendra Index ID
 kendra_index_id = '1c088278-9865-482f-a9bd-02403d6e9fd0'
 s3_bucket_name = 'chatbot-knowledgebase-md'
@@ -356,6 +361,13 @@ def process_s3_file(bucket_name, file_key):
         )
         
         logger.info(f"Kendra indexing response: {json.dumps(response)}")
+
+        # Update the FAQ index for this file; Kendra still has the document if this fails
+        faq_count = 0
+        try:
+            faq_count = sync_faq_entries(faq_table, file_key, extract_faq_entries(file_content))
+        except Exception as e:
+            logger.error(f"Error updating FAQ index: {str(e)}")
         
         return {
             'statusCode': 200,
@@ -366,7 +378,8 @@ def process_s3_file(bucket_name, file_key):
             'body': json.dumps({
                 'message': 'File processed and indexed successfully',
                 'documentId': document_id,
-                'title': title
+                'title': title,
+                'faqEntries': faq_count
             })
         }
     
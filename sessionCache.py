@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-turn cost of the dict and string objects on top of the text itself
+TURN_OVERHEAD_BYTES = 300
+
+
+def turn_size(turn):
+    """Approximate memory footprint of one conversation turn in bytes"""
+    return TURN_OVERHEAD_BYTES + sum(len(str(value).encode('utf-8')) for value in turn.values())
+
+
+class SessionHistoryCache:
+    """
+    Per-container LRU of the most recent turns of each session, bounded by total
+    memory size rather than entry count. Entries are treated as misses once
+    `ttl_seconds` have passed since they were last read from DynamoDB, since
+    another container may have served the session since. Write-through appends
+    do not extend that lifetime.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, max_turns=3, ttl_seconds=900, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session_id -> (turns oldest first, size in bytes, read from DynamoDB at)
+        self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """Return the cached turns (oldest first), or None on a miss"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if self._clock() - entry[2] > self.ttl_seconds:
+                self._remove(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(entry[0])
+
+    def put(self, session_id, turns):
+        """Cache a session's history as read from DynamoDB (oldest first)"""
+        with self._lock:
+            self._store(session_id, list(turns)[-self.max_turns:], self._clock())
+
+    def append(self, session_id, turn):
+        """Write-through a new turn; only sessions already cached are updated"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return False
+            self._store(session_id, (entry[0] + [turn])[-self.max_turns:], entry[2])
+            return True
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+
+    def _store(self, session_id, turns, read_at):
+        self._remove(session_id)
+        size = sum(turn_size(turn) for turn in turns)
+        if size > self.max_bytes:
+            return
+        self._sessions[session_id] = (turns, size, read_at)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._sessions.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+    def _remove(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
@@ -0,0 +1,248 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+from awsResilience import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CONNECT_TIMEOUT,
+    CircuitOpenError,
+    DeadlineExceededError,
+    DeadlineScaledBedrockClient,
+    Metrics,
+    ResilientBedrockClient,
+    ResilientKendraClient,
+    RetryPolicy,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class StubClient:
+    """Throttles while `throttle` is set; each call takes `latency` fake seconds"""
+
+    def __init__(self, clock, throttle=False, latency=0.0, error_code='ThrottlingException'):
+        self.clock = clock
+        self.throttle = throttle
+        self.latency = latency
+        self.error_code = error_code
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        self.clock.sleep(self.latency)
+        if self.throttle:
+            raise ClientError({'Error': {'Code': self.error_code, 'Message': 'stub'}}, 'InvokeModel')
+        return {'ok': True}
+
+
+def make_policy(clock, **kwargs):
+    kwargs.setdefault('attempt_timeout', 1.0)
+    kwargs.setdefault('deadline', 100.0)
+    return RetryPolicy(sleep=clock.sleep, clock=clock, rng=lambda: 1.0, **kwargs)
+
+
+def test_breaker_opens_at_failure_threshold():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=10, clock=clock, registry=None)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+
+
+def test_open_breaker_fails_fast_without_calling_client():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock, registry=None)
+    client = StubClient(clock, throttle=True)
+    policy = make_policy(clock, max_attempts=5)
+    with pytest.raises(ClientError):
+        policy.call('test', breaker, client.invoke_model)
+    assert client.calls == 1
+
+    with pytest.raises(CircuitOpenError):
+        policy.call('test', breaker, client.invoke_model)
+    assert client.calls == 1
+
+
+def test_half_open_allows_a_single_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock, registry=None)
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    clock.now = 10
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # A failed trial reopens the breaker for another reset_timeout
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+
+
+def test_successful_trial_closes_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock, registry=None)
+    client = StubClient(clock, throttle=True)
+    policy = make_policy(clock, max_attempts=1)
+    with pytest.raises(ClientError):
+        policy.call('test', breaker, client.invoke_model)
+
+    clock.now = 10
+    client.throttle = False
+    assert policy.call('test', breaker, client.invoke_model) == {'ok': True}
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+
+def test_non_retryable_error_is_not_retried_or_counted():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock, registry=None)
+    client = StubClient(clock, throttle=True, error_code='ValidationException')
+    policy = make_policy(clock, max_attempts=5)
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            policy.call('test', breaker, client.invoke_model)
+    assert client.calls == 3
+    assert breaker.state == STATE_CLOSED
+
+
+def test_retry_stops_at_max_attempts():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=100, clock=clock, registry=None)
+    client = StubClient(clock, throttle=True)
+    policy = make_policy(clock, max_attempts=3)
+    with pytest.raises(ClientError):
+        policy.call('test', breaker, client.invoke_model)
+    assert client.calls == 3
+
+
+def test_retry_stops_before_deadline():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=100, clock=clock, registry=None)
+    client = StubClient(clock, throttle=True, latency=0.5)
+    # Backoff is capped at 1 s (rng pinned to 1.0); each attempt may take 1 s
+    policy = make_policy(clock, max_attempts=100, base_delay=1.0, max_delay=1.0, attempt_timeout=1.0)
+    with pytest.raises(ClientError):
+        policy.call('test', breaker, client.invoke_model, deadline_at=6.0)
+    # Attempts start at 0, 1.5, 3 and 4.5 s; a fifth at 6 s would not finish in time
+    assert client.calls == 4
+    assert clock.now <= 6.0
+
+
+def test_no_attempt_when_deadline_already_too_close():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', clock=clock, registry=None)
+    client = StubClient(clock)
+    policy = make_policy(clock, attempt_timeout=5.0)
+    with pytest.raises(DeadlineExceededError):
+        policy.call('test', breaker, client.invoke_model, deadline_at=4.0)
+    assert client.calls == 0
+
+
+def test_bedrock_fails_over_when_first_region_breaker_is_open():
+    clock = FakeClock()
+    primary = StubClient(clock, throttle=True)
+    secondary = StubClient(clock)
+    bedrock = ResilientBedrockClient(
+        ['r1', 'r2'],
+        clients={'r1': primary, 'r2': secondary},
+        retry_policy=make_policy(clock, max_attempts=1),
+        failure_threshold=1,
+        reset_timeout=60,
+    )
+    assert bedrock.invoke_model(modelId='m') == {'ok': True}
+    assert bedrock.endpoints[0][2].state == STATE_OPEN
+
+    # With r1's breaker open, the next call goes straight to r2
+    assert bedrock.invoke_model(modelId='m') == {'ok': True}
+    assert primary.calls == 1
+    assert secondary.calls == 2
+
+
+def test_bedrock_failover_shares_one_deadline():
+    clock = FakeClock()
+    primary = StubClient(clock, throttle=True, latency=3.0)
+    secondary = StubClient(clock)
+    bedrock = ResilientBedrockClient(
+        ['r1', 'r2'],
+        clients={'r1': primary, 'r2': secondary},
+        retry_policy=make_policy(clock, max_attempts=1, attempt_timeout=4.0),
+    )
+    # r1 uses 3 of the 5 s, leaving too little for an attempt in r2
+    with pytest.raises(ClientError):
+        bedrock.invoke_model(deadline_at=5.0, modelId='m')
+    assert secondary.calls == 0
+
+
+def test_wrapped_clients_make_a_single_request_per_attempt():
+    kendra = ResilientKendraClient(region_name='ap-southeast-1')
+    bedrock = ResilientBedrockClient(['ap-southeast-1', 'us-east-1'])
+    clients = [kendra.client] + [client.client_for(10) for _, client, _ in bedrock.endpoints]
+    for client in clients:
+        assert client.meta.config.retries == {'total_max_attempts': 1, 'mode': 'adaptive'}
+
+
+def test_bedrock_read_timeout_fits_the_time_left():
+    clock = FakeClock()
+    client = DeadlineScaledBedrockClient('ap-southeast-1', max_read_timeout=23, clock=clock)
+    assert client.read_timeout_for(25.0) == 23
+    clock.now = 10.0
+    assert client.read_timeout_for(25.0) == 13
+    assert client.read_timeout_for(25.0) <= 25.0 - clock.now - CONNECT_TIMEOUT
+    assert client.client_for(13).meta.config.read_timeout == 13
+
+
+def test_bedrock_read_timeout_is_not_retried():
+    clock = FakeClock()
+
+    class TimingOutClient:
+        calls = 0
+
+        def invoke_model(self, **kwargs):
+            self.calls += 1
+            clock.sleep(5)
+            raise ReadTimeoutError(endpoint_url='https://bedrock-runtime.example')
+
+    first, second = TimingOutClient(), TimingOutClient()
+    bedrock = ResilientBedrockClient(['r1', 'r2'], clients={'r1': first, 'r2': second},
+                                     retry_policy=make_policy(clock, retry_read_timeouts=False, attempt_timeout=4.0))
+    with pytest.raises(ReadTimeoutError):
+        bedrock.invoke_model(deadline_at=12.0, modelId='m', body='{}')
+    # One attempt per region, and no further failover once the deadline is too close
+    assert (first.calls, second.calls) == (1, 1)
+    assert clock.now == 10
+
+
+def test_emit_writes_pure_json_emf_lines(capsys):
+    registry = Metrics(namespace='Test/Namespace', dimension='Cache')
+    CircuitBreaker('bedrock:r1', registry=registry)
+    registry.increment('session_history', 'Hits', 2)
+    registry.emit()
+
+    lines = capsys.readouterr().out.splitlines()
+    records = [json.loads(line) for line in lines]
+    assert len(records) == 2
+    counters, breaker = records
+    assert counters['Cache'] == 'session_history' and counters['Hits'] == 2
+    assert counters['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'Test/Namespace'
+    assert breaker['Breaker'] == 'bedrock:r1' and breaker['BreakerOpen'] == 0
+
+    # Counters are reset after each emit
+    registry.emit()
+    assert len(capsys.readouterr().out.splitlines()) == 1
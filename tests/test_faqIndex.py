@@ -0,0 +1,215 @@
+from faqIndex import META_KEY, META_SOURCE, FAQIndex, extract_faq_entries, sync_faq_entries
+
+
+class FakeTable:
+    """In-memory stand-in for the ChatbotFAQ table (partition `source`, sort `question_key`)"""
+
+    def __init__(self):
+        self.items = {}
+        self.writes = 0
+
+    def query(self, ExpressionAttributeValues, **kwargs):
+        source = ExpressionAttributeValues[':source']
+        return {'Items': [dict(item) for (s, _), item in self.items.items() if s == source]}
+
+    def batch_writer(self):
+        table = self
+
+        class Batch:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def put_item(self, Item):
+                table.writes += 1
+                table.items[(Item['source'], Item['question_key'])] = dict(Item)
+
+            def delete_item(self, Key):
+                table.writes += 1
+                del table.items[(Key['source'], Key['question_key'])]
+
+        return Batch()
+
+    def update_item(self, Key, **kwargs):
+        item = self.items.setdefault((Key['source'], Key['question_key']), dict(Key, version=0))
+        item['version'] += 1
+
+    def get_item(self, Key):
+        item = self.items.get((Key['source'], Key['question_key']))
+        return {'Item': dict(item)} if item else {}
+
+    def scan(self, **kwargs):
+        return {'Items': [dict(item) for item in self.items.values()]}
+
+    @property
+    def version(self):
+        return self.items.get((META_SOURCE, META_KEY), {}).get('version', 0)
+
+
+def questions(entries):
+    return [entry['question'] for entry in entries]
+
+
+def test_question_heading_keeps_deeper_sub_headings_in_answer():
+    entries = extract_faq_entries(
+        "## What is AWS?\n"
+        "A cloud platform.\n"
+        "### Regions\n"
+        "Many regions.\n"
+        "## Next section\n"
+        "Unrelated.\n"
+    )
+    assert entries == [{'question': 'What is AWS?', 'answer': 'A cloud platform.\nRegions\nMany regions.'}]
+
+
+def test_nested_question_heading_becomes_its_own_entry():
+    entries = extract_faq_entries(
+        "## What is X?\n"
+        "X is a service.\n"
+        "### How do I sign up?\n"
+        "Use the console.\n"
+    )
+    assert entries == [
+        {'question': 'What is X?', 'answer': 'X is a service.'},
+        {'question': 'How do I sign up?', 'answer': 'Use the console.'},
+    ]
+
+
+def test_bold_q_and_a_pairs():
+    entries = extract_faq_entries(
+        "**Q:** How do I reset my password?\n"
+        "**A:** Open settings and click reset.\n"
+        "\n"
+        "Q: Is there a free tier?\n"
+        "A: Yes.\n"
+        "\n"
+        "Trailing paragraph.\n"
+    )
+    assert entries == [
+        {'question': 'How do I reset my password?', 'answer': 'Open settings and click reset.'},
+        {'question': 'Is there a free tier?', 'answer': 'Yes.'},
+    ]
+
+
+def test_answer_on_line_after_a_marker():
+    entries = extract_faq_entries(
+        "**Q:** Where are the logs?\n"
+        "**A:**\n"
+        "In CloudWatch.\n"
+    )
+    assert entries == [{'question': 'Where are the logs?', 'answer': 'In CloudWatch.'}]
+
+
+def test_headings_inside_fenced_code_are_ignored():
+    entries = extract_faq_entries(
+        "## Setup\n"
+        "```\n"
+        "# What is this comment?\n"
+        "Q: not a question either\n"
+        "```\n"
+    )
+    assert entries == []
+
+
+def test_non_question_headings_are_skipped():
+    entries = extract_faq_entries(
+        "# Guide\n"
+        "Intro.\n"
+        "## Pricing\n"
+        "Pay as you go.\n"
+        "## Why choose AWS\n"
+        "Reliability.\n"
+    )
+    assert questions(entries) == ['Why choose AWS']
+
+
+def test_sync_removes_deleted_questions_and_keeps_other_files():
+    table = FakeTable()
+    sync_faq_entries(table, 'a.md', [
+        {'question': 'What is A?', 'answer': 'A.'},
+        {'question': 'What is B?', 'answer': 'B.'},
+    ])
+    sync_faq_entries(table, 'other.md', [{'question': 'What is C?', 'answer': 'C.'}])
+
+    sync_faq_entries(table, 'a.md', [{'question': 'What is A?', 'answer': 'A, updated.'}])
+
+    keys = {key: item['answer'] for key, item in table.items.items() if key[0] != META_SOURCE}
+    assert keys == {
+        ('a.md', 'what is a'): 'A, updated.',
+        ('other.md', 'what is c'): 'C.',
+    }
+
+
+def test_sync_does_not_bump_version_when_nothing_changed():
+    table = FakeTable()
+    entries = [{'question': 'What is A?', 'answer': 'A.'}]
+    sync_faq_entries(table, 'a.md', entries)
+    version, writes = table.version, table.writes
+
+    sync_faq_entries(table, 'a.md', entries)
+    sync_faq_entries(table, 'empty.md', [])
+
+    assert table.version == version
+    assert table.writes == writes
+
+
+def test_index_matches_exact_and_near_questions():
+    table = FakeTable()
+    sync_faq_entries(table, 'a.md', [{'question': 'How do I reset my password?', 'answer': 'Use settings.'}])
+    index = FAQIndex(table)
+
+    assert index.lookup('how do I reset my password') == ('Use settings.', 'a.md')
+    assert index.lookup('Reset password how?') == ('Use settings.', 'a.md')
+    assert index.lookup('What is the weather?') is None
+
+
+def test_preload_loads_once_and_lookup_skips_rescan():
+    table = FakeTable()
+    sync_faq_entries(table, 'a.md', [{'question': 'What is A?', 'answer': 'A.'}])
+    scans = []
+    table_scan = table.scan
+    table.scan = lambda **kwargs: scans.append(kwargs) or table_scan(**kwargs)
+
+    index = FAQIndex(table)
+    index.preload()
+    assert index.lookup('What is A?') == ('A.', 'a.md')
+    assert len(scans) == 1
+
+
+def faq_items(count):
+    """`count` questions that all mention aws, each with two tokens of its own"""
+    return [
+        {'source': 'big.md', 'question_key': f'how do i use aws service{i} feature{i}',
+         'question': f'How do I use AWS service{i} feature{i}?', 'answer': f'Answer {i}.'}
+        for i in range(count)
+    ]
+
+
+def test_lookup_scans_few_candidates_in_a_large_index():
+    index = FAQIndex(FakeTable())
+    index.load(faq_items(3000))
+    index._checked_at = index._clock()
+
+    assert index.lookup('AWS service42 feature42 use') == ('Answer 42.', 'big.md')
+    # The token every entry shares is never scanned, nor are entries of the wrong size
+    assert index.candidates(frozenset({'aws', 'use', 'service42', 'feature42'})) == {'how do i use aws service42 feature42'}
+    assert index.candidates(frozenset({'aws', 'use', 'billing', 'alerts'})) == set()
+    assert index.candidates(frozenset({'aws'})) == set()
+
+
+def test_candidate_filtering_matches_a_full_scan():
+    items = faq_items(50) + [
+        {'source': 'a.md', 'question_key': 'aws', 'question': 'AWS?', 'answer': 'Cloud.'},
+        {'source': 'a.md', 'question_key': 'aws use', 'question': 'AWS use?', 'answer': 'Use it.'},
+    ]
+    index = FAQIndex(FakeTable(), min_similarity=0.6)
+    index.load(items)
+    entries, _ = index._index
+    queries = [{'aws'}, {'aws', 'use'}, {'aws', 'use', 'service7'}, {'use', 'service7', 'feature7'},
+               {'aws', 'use', 'service7', 'feature7', 'quickly'}, {'service7', 'feature8'}]
+    for query in map(frozenset, queries):
+        expected = {key for key, (_, _, tokens) in entries.items()
+                    if len(query & tokens) / len(query | tokens) >= 0.6}
+        assert expected <= index.candidates(query)
@@ -0,0 +1,130 @@
+import json
+import math
+import random
+
+import pytest
+from boto3.dynamodb.conditions import Key
+
+from loadTest import (
+    LatencyModel,
+    QuestionSampler,
+    StandInStats,
+    TableStandIn,
+    load_corpus,
+    parse_args,
+    percentile,
+)
+
+
+def test_latency_sigma_matches_median_and_p99():
+    model = LatencyModel(100, 100 * math.exp(2.326))
+    assert model.sigma == pytest.approx(1.0)
+    assert LatencyModel(100, 100).sigma == 0.0
+
+    rng = random.Random(1)
+    samples = sorted(rng.lognormvariate(math.log(model.median_ms), model.sigma) for _ in range(20000))
+    assert percentile(samples, 50) == pytest.approx(100, rel=0.05)
+    assert percentile(samples, 99) == pytest.approx(100 * math.exp(2.326), rel=0.1)
+
+
+def test_latency_spec_parsing():
+    model = LatencyModel.parse('80,300', throttle_rate=0.1)
+    assert (model.median_ms, model.throttle_rate) == (80, 0.1)
+    assert model.sigma == pytest.approx(math.log(300 / 80) / 2.326)
+    assert LatencyModel.parse('50').sigma == 0.0
+    with pytest.raises(ValueError):
+        LatencyModel.parse('500,100')
+
+
+@pytest.mark.parametrize('argv', [
+    ['--kendra-throttle', '1.5'],
+    ['--dynamodb-throttle', '-0.1'],
+    ['--bedrock-throttle', '2'],
+    ['--kendra-hit-rate', '1.01'],
+    ['--bedrock-ms', '1500,1000'],
+    ['--qps', '0'],
+])
+def test_invalid_arguments_are_rejected(argv):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+
+
+def test_valid_arguments_are_accepted():
+    args = parse_args(['--kendra-hit-rate', '1', '--bedrock-throttle', '0', '--dynamodb-ms', '8'])
+    assert (args.kendra_hit_rate, args.bedrock_throttle, args.dynamodb_ms) == (1.0, 0.0, '8')
+
+
+def test_sampler_with_zero_exponent_is_uniform():
+    questions = [f"q{i}" for i in range(10)]
+    sampler = QuestionSampler(questions, 0, random.Random(7))
+    counts = {}
+    for _ in range(20000):
+        question = sampler.sample()
+        counts[question] = counts.get(question, 0) + 1
+    assert set(counts) == set(questions)
+    assert all(1700 < count < 2300 for count in counts.values())
+
+
+def test_sampler_popularity_follows_rank():
+    sampler = QuestionSampler(['a', 'b', 'c', 'd'], 1.0, random.Random(7))
+    counts = {}
+    for _ in range(20000):
+        question = sampler.sample()
+        counts[question] = counts.get(question, 0) + 1
+    # Zipf(1): rank r is drawn 1/r as often as rank 1
+    assert counts['a'] / counts['b'] == pytest.approx(2, rel=0.1)
+    assert counts['a'] / counts['d'] == pytest.approx(4, rel=0.15)
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+    assert percentile([42], 99) == 42
+    assert percentile([], 50) == 0.0
+
+
+def test_load_corpus_formats(tmp_path):
+    jsonl = tmp_path / 'questions.jsonl'
+    jsonl.write_text('{"question": "What is A?"}\n\n{"title": "What is B?"}\n{"other": 1}\n"What is C?"\n')
+    assert load_corpus(str(jsonl)) == ['What is A?', 'What is B?', 'What is C?']
+
+    event = tmp_path / 'event.json'
+    event.write_text(json.dumps({'question': 'What is D?', 'session_id': 's1'}))
+    assert load_corpus(str(event)) == ['What is D?']
+
+    listing = tmp_path / 'list.JSON'
+    listing.write_text(json.dumps(['What is E?', {'question': 'What is F?'}]))
+    assert load_corpus(str(listing)) == ['What is E?', 'What is F?']
+
+    plain = tmp_path / 'questions.txt'
+    plain.write_text('What is G?\n\n  What is H?  \n')
+    assert load_corpus(str(plain)) == ['What is G?', 'What is H?']
+
+
+def test_table_query_projects_and_orders_like_dynamodb():
+    table = TableStandIn(LatencyModel(0, 0), StandInStats(), 'ChatbotMemory')
+    for ts in ['2024-01-01T00:00:03', '2024-01-01T00:00:01', '2024-01-01T00:00:04', '2024-01-01T00:00:02']:
+        table.put_item(Item={'session_id': 's1', 'timestamp': ts, 'question': f"q{ts[-1]}",
+                             'answer': f"a{ts[-1]}", 'context': 'long kendra context'})
+    table.put_item(Item={'session_id': 's2', 'timestamp': '2024-01-01T00:00:09', 'question': 'other', 'answer': 'other'})
+
+    # The same request getChabotResponse.get_previous_conversations makes
+    response = table.query(
+        KeyConditionExpression=Key('session_id').eq('s1'),
+        ProjectionExpression='#q, #a, #ts',
+        ExpressionAttributeNames={'#q': 'question', '#a': 'answer', '#ts': 'timestamp'},
+        ScanIndexForward=False,
+        Limit=3,
+    )
+    assert response['Items'] == [
+        {'question': 'q4', 'answer': 'a4', 'timestamp': '2024-01-01T00:00:04'},
+        {'question': 'q3', 'answer': 'a3', 'timestamp': '2024-01-01T00:00:03'},
+        {'question': 'q2', 'answer': 'a2', 'timestamp': '2024-01-01T00:00:02'},
+    ]
+
+    oldest_first = table.query(KeyConditionExpression=Key('session_id').eq('s1'), ScanIndexForward=True)
+    assert [item['question'] for item in oldest_first['Items']] == ['q1', 'q2', 'q3', 'q4']
+    assert oldest_first['Items'][0]['context'] == 'long kendra context'
@@ -0,0 +1,87 @@
+from sessionCache import SessionHistoryCache, turn_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def turn(text, answer_chars=10):
+    return {'question': text, 'answer': 'x' * answer_chars, 'timestamp': text}
+
+
+def test_hit_and_miss():
+    cache = SessionHistoryCache(clock=FakeClock())
+    assert cache.get('s1') is None
+    cache.put('s1', [turn('a'), turn('b')])
+    assert cache.get('s1') == [turn('a'), turn('b')]
+
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = SessionHistoryCache(ttl_seconds=60, clock=clock)
+    cache.put('s1', [turn('a')])
+    clock.now = 61
+    assert cache.get('s1') is None
+    assert len(cache) == 0
+    assert cache.size_bytes == 0
+
+
+def test_write_through_does_not_extend_ttl():
+    clock = FakeClock()
+    cache = SessionHistoryCache(ttl_seconds=60, clock=clock)
+    cache.put('s1', [turn('a')])
+    clock.now = 50
+    assert cache.append('s1', turn('b'))
+    clock.now = 61
+    assert cache.get('s1') is None
+
+
+def test_write_through_to_uncached_session_is_a_no_op():
+    cache = SessionHistoryCache(clock=FakeClock())
+    assert not cache.append('s1', turn('a'))
+    assert cache.get('s1') is None
+    assert cache.size_bytes == 0
+
+
+def test_append_keeps_only_max_turns():
+    cache = SessionHistoryCache(max_turns=2, clock=FakeClock())
+    cache.put('s1', [turn('a'), turn('b')])
+    cache.append('s1', turn('c'))
+    assert [t['question'] for t in cache.get('s1')] == ['b', 'c']
+
+
+def test_size_bytes_after_replace_and_evict():
+    size = turn_size(turn('a'))
+    cache = SessionHistoryCache(max_bytes=2 * size, clock=FakeClock())
+    cache.put('s1', [turn('a')])
+    cache.put('s1', [turn('b')])
+    assert cache.size_bytes == size
+
+    cache.put('s2', [turn('c')])
+    assert cache.size_bytes == 2 * size
+    cache.put('s3', [turn('d')])
+    assert len(cache) == 2
+    assert cache.size_bytes == 2 * size
+
+
+def test_session_larger_than_cache_is_not_stored():
+    cache = SessionHistoryCache(max_bytes=100, clock=FakeClock())
+    cache.put('s1', [turn('a', answer_chars=1000)])
+    assert cache.get('s1') is None
+    assert cache.size_bytes == 0
+
+
+def test_evicts_least_recently_used_first():
+    size = turn_size(turn('a'))
+    cache = SessionHistoryCache(max_bytes=2 * size, clock=FakeClock())
+    cache.put('s1', [turn('a')])
+    cache.put('s2', [turn('b')])
+    cache.get('s1')  # s2 is now least recently used
+    cache.put('s3', [turn('c')])
+    assert cache.get('s2') is None
+    assert cache.get('s1') is not None
+    assert cache.get('s3') is not None